@@ -11,11 +11,15 @@ import zipfile
 import io
 import shutil
 import base64
+import queue
+import threading
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 200 * 1024 * 1024  # 200MB
 app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'uploads')
 app.config['OUTPUT_FOLDER'] = os.path.join(os.path.dirname(__file__), 'output')
+app.config['WRITER_QUEUE_SIZE'] = 8       # 渲染 → 写盘队列上限（背压）
+app.config['BUILD_ARCHIVE'] = True        # 写盘时同步生成下载用 ZIP
 
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS', 'DejaVu Sans']
@@ -91,6 +95,112 @@ def fig_to_base64(fig):
     return base64.b64encode(buf.read()).decode('utf-8')
 
 
+def fig_to_png_bytes(fig, dpi=150):
+    """将 matplotlib fig 编码为 PNG 字节（不关闭 fig）"""
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
+    return buf.getvalue()
+
+
+def archive_path(session_id):
+    """会话预生成 ZIP 的路径（放在输出目录之外，避免被打包进自身）"""
+    return os.path.join(app.config['OUTPUT_FOLDER'], f'{session_id}.zip')
+
+
+class ChartWriter:
+    """后台写盘线程：从有界队列取出 PNG 字节，写入输出目录并追加到 ZIP
+
+    渲染在请求线程中进行（pyplot 非线程安全），写盘与打包在独立线程中进行，
+    两者重叠执行；队列满时 put() 阻塞，形成背压，限制内存占用。
+    """
+
+    def __init__(self, output_dir, archive_file=None, maxsize=8):
+        self.output_dir = output_dir
+        self.archive_file = archive_file
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def error(self):
+        """写盘线程中出现的异常（无则为 None）"""
+        return self._error
+
+    def put(self, file_name, png_bytes):
+        """提交一张图片；队列满时阻塞。写盘已出错时直接丢弃"""
+        if self._error is None:
+            self._queue.put((file_name, png_bytes))
+
+    def close(self):
+        """等待队列全部写完并结束线程，可重复调用"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        zf = None
+        tmp_archive = None
+        written = set()
+        if self.archive_file:
+            tmp_archive = self.archive_file + '.part'
+            try:
+                zf = zipfile.ZipFile(tmp_archive, 'w', zipfile.ZIP_DEFLATED)
+            except OSError:
+                zf = None  # 仅影响预生成，下载时回退为从目录打包
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                continue  # 出错后继续消费，避免生产者阻塞
+            file_name, png_bytes = item
+            try:
+                with open(os.path.join(self.output_dir, file_name), 'wb') as out:
+                    out.write(png_bytes)
+            except Exception as e:
+                self._error = e
+                continue
+            if zf is not None:
+                try:
+                    if file_name in written:
+                        # 重名文件会覆盖磁盘上的旧图，ZIP 无法覆盖条目，
+                        # 放弃预生成，下载时改为从目录打包
+                        zf = self._drop_archive(zf, tmp_archive)
+                    else:
+                        zf.writestr(file_name, png_bytes)
+                except Exception:
+                    zf = self._drop_archive(zf, tmp_archive)
+            written.add(file_name)
+        if zf is not None:
+            try:
+                zf.close()
+                if self._error is None:
+                    os.replace(tmp_archive, self.archive_file)
+            except Exception:
+                pass
+        if tmp_archive:
+            self._drop_archive(None, tmp_archive)  # 清理未完成的 .part
+
+    @staticmethod
+    def _drop_archive(zf, tmp_archive):
+        """放弃预生成的 ZIP（关闭并删除 .part），失败不影响图表输出"""
+        if zf is not None:
+            try:
+                zf.close()
+            except Exception:
+                pass
+        try:
+            if os.path.exists(tmp_archive):
+                os.remove(tmp_archive)
+        except OSError:
+            pass
+        return None
+
+
 # ── 路由 ──────────────────────────────────────────────────
 
 @app.route('/')
@@ -179,45 +289,62 @@ def process():
     if os.path.exists(output_dir):
         shutil.rmtree(output_dir)
     os.makedirs(output_dir)
+    zip_file = archive_path(session_id)
+    if os.path.exists(zip_file):
+        os.remove(zip_file)
+
+    writer = ChartWriter(
+        output_dir,
+        archive_file=zip_file if app.config['BUILD_ARCHIVE'] else None,
+        maxsize=app.config['WRITER_QUEUE_SIZE'],
+    ).start()
 
     results = []
     first_preview = None
 
-    for idx, row in df.iterrows():
-        if name_column and name_column in df.columns:
-            row_name = str(row[name_column])
-        else:
-            row_name = f"row_{idx + 2}"
-
-        safe_name = sanitize_filename(row_name)
+    try:
+        for idx, row in df.iterrows():
+            if name_column and name_column in df.columns:
+                row_name = str(row[name_column])
+            else:
+                row_name = f"row_{idx + 2}"
 
-        if data_column not in df.columns:
-            continue
+            safe_name = sanitize_filename(row_name)
 
-        data_values = parse_data(row[data_column])
-        if not data_values:
-            continue
+            if data_column not in df.columns:
+                continue
 
-        fig = plot_chart(data_values, row_name, chart_type, color)
-        if fig:
-            out_file = os.path.join(output_dir, f'{safe_name}.png')
-            fig.savefig(out_file, dpi=150, bbox_inches='tight')
+            data_values = parse_data(row[data_column])
+            if not data_values:
+                continue
 
-            # 第一张图做预览
-            if first_preview is None:
-                first_preview = fig_to_base64(fig)
-            else:
-                plt.close(fig)
-
-            results.append({
-                'row_name': row_name,
-                'row_number': idx + 2,
-                'data_points': len(data_values),
-                'min_value': f"{min(data_values):.2f}",
-                'max_value': f"{max(data_values):.2f}",
-                'mean_value': f"{np.mean(data_values):.2f}",
-                'file_name': f'{safe_name}.png'
-            })
+            if writer.error is not None:
+                break
+
+            fig = plot_chart(data_values, row_name, chart_type, color)
+            if fig:
+                writer.put(f'{safe_name}.png', fig_to_png_bytes(fig))
+
+                # 第一张图做预览
+                if first_preview is None:
+                    first_preview = fig_to_base64(fig)
+                else:
+                    plt.close(fig)
+
+                results.append({
+                    'row_name': row_name,
+                    'row_number': idx + 2,
+                    'data_points': len(data_values),
+                    'min_value': f"{min(data_values):.2f}",
+                    'max_value': f"{max(data_values):.2f}",
+                    'mean_value': f"{np.mean(data_values):.2f}",
+                    'file_name': f'{safe_name}.png'
+                })
+    finally:
+        writer.close()
+
+    if writer.error is not None:
+        return jsonify({'error': f'保存图表失败: {str(writer.error)}'}), 500
 
     return jsonify({
         'success': True,
@@ -234,6 +361,16 @@ def download_zip(session_id):
     if not os.path.exists(output_dir):
         return jsonify({'error': '找不到生成的文件'}), 404
 
+    # 处理时已预生成的 ZIP 直接返回
+    zip_file = archive_path(session_id)
+    if os.path.isfile(zip_file):
+        return send_file(
+            zip_file,
+            mimetype='application/zip',
+            as_attachment=True,
+            download_name='charts.zip'
+        )
+
     buf = io.BytesIO()
     with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
         for fname in os.listdir(output_dir):
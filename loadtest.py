@@ -0,0 +1,527 @@
+"""PIR CurveTools 压力测试工具
+
+在本地启动 app.py（gunicorn 或 Flask 自带服务器），按设定并发回放完整会话
+  GET /  →  POST /upload  →  POST /process  →  GET /download/<session_id>
+并统计各接口延迟分位数、错误率 / 超时率、worker 内存（RSS）和磁盘增长。
+
+示例：
+    python loadtest.py --concurrency 4 --sessions 40 --rows 200 --points 500
+    python loadtest.py --worker-class gthread --threads 4 --workers 2
+    python loadtest.py --server none --url http://127.0.0.1:5000   # 压测已运行的服务
+
+仅依赖标准库；若安装了 psutil 则用它采集内存，否则读取 /proc（Linux）。
+"""
+
+import argparse
+import http.client
+import io
+import json
+import math
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
+OUTPUT_FOLDER = os.path.join(BASE_DIR, 'output')
+ENDPOINTS = ('index', 'upload', 'process', 'download')
+
+
+# ── 测试数据 ──────────────────────────────────────────────
+
+def make_csv(rows, points, seed=0):
+    """生成与真实上传文件结构一致的 CSV：名称列 + 逗号分隔的数据列"""
+    rnd = random.Random(seed)
+    buf = io.StringIO()
+    buf.write('name,data\n')
+    for i in range(rows):
+        base = rnd.uniform(0, 100)
+        values = ','.join(f'{base + rnd.gauss(0, 5):.3f}' for _ in range(points))
+        buf.write(f'sensor_{i + 1},"{values}"\n')
+    return buf.getvalue().encode('utf-8')
+
+
+def encode_multipart(field, filename, content, content_type='text/csv'):
+    """手工构造 multipart/form-data 请求体"""
+    boundary = uuid.uuid4().hex
+    head = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode('utf-8')
+    tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return head + content + tail, f'multipart/form-data; boundary={boundary}'
+
+
+# ── 服务进程 ──────────────────────────────────────────────
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, port):
+    """按参数启动被测服务，返回 Popen 对象"""
+    env = dict(os.environ, PORT=str(port))
+    if args.server == 'gunicorn':
+        cmd = [
+            sys.executable, '-m', 'gunicorn', 'app:app',
+            '--bind', f'127.0.0.1:{port}',
+            '--workers', str(args.workers),
+            '--timeout', str(args.server_timeout),
+            '--worker-class', args.worker_class,
+        ]
+        if args.threads:
+            cmd += ['--threads', str(args.threads)]
+    else:
+        cmd = [sys.executable, 'app.py']
+    return subprocess.Popen(
+        cmd, cwd=BASE_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def wait_ready(url, proc, timeout=30):
+    """轮询首页直到服务可用"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f'服务进程已退出，返回码 {proc.returncode}')
+        try:
+            with urllib.request.urlopen(url + '/', timeout=2) as resp:
+                if resp.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.3)
+    raise RuntimeError(f'服务在 {timeout}s 内未就绪: {url}')
+
+
+def stop_server(proc):
+    if proc is None or proc.poll() is not None:
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=10)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+# ── 资源采样 ──────────────────────────────────────────────
+
+def _proc_children(pid):
+    """读取 /proc 获取直接子进程（无 psutil 时使用）"""
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # 第 4 个字段为 ppid；进程名可能含空格，从最后一个 ')' 之后解析
+        fields = stat.rsplit(')', 1)[-1].split()
+        if len(fields) > 1 and int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+def _proc_rss(pid):
+    """读取 /proc/<pid>/status 中的 VmRSS，单位字节"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def sample_rss(pid):
+    """返回 {pid: rss}，包含主进程及其全部子进程（gunicorn worker）"""
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            procs = [root] + root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return {}
+        result = {}
+        for p in procs:
+            try:
+                result[p.pid] = p.memory_info().rss
+            except psutil.NoSuchProcess:
+                continue
+        return result
+    pids, stack = [], [pid]
+    while stack:
+        p = stack.pop()
+        pids.append(p)
+        stack.extend(_proc_children(p))
+    return {p: _proc_rss(p) for p in pids}
+
+
+class RssSampler:
+    """后台线程定期采样服务进程树内存，记录每个进程的峰值和总和峰值"""
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.peak_per_pid = {}
+        self.peak_total = 0
+        self.last_total = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = sample_rss(self.pid)
+            for p, v in rss.items():
+                self.peak_per_pid[p] = max(self.peak_per_pid.get(p, 0), v)
+            self.last_total = sum(rss.values())
+            self.peak_total = max(self.peak_total, self.last_total)
+            self._stop.wait(self.interval)
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+# ── 会话回放 ──────────────────────────────────────────────
+
+class Stats:
+    """线程安全的请求结果记录"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {name: [] for name in ENDPOINTS}
+        self.errors = {name: 0 for name in ENDPOINTS}
+        self.timeouts = {name: 0 for name in ENDPOINTS}
+        self.sessions_ok = 0
+        self.sessions_failed = 0
+        self.session_ids = []
+
+    def record(self, name, elapsed, outcome):
+        with self.lock:
+            if outcome == 'ok':
+                self.latency[name].append(elapsed)
+            elif outcome == 'timeout':
+                self.timeouts[name] += 1
+            else:
+                self.errors[name] += 1
+
+
+def timed_request(stats, name, req, timeout, server_timeout=None):
+    """发送请求并记录耗时；失败返回 None
+
+    除客户端超时外，连接在接近 server_timeout 秒后被重置 / 断开 / 截断，
+    视为 gunicorn 因超时杀掉了 worker，同样计为超时。
+    """
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = resp.read()
+        stats.record(name, time.perf_counter() - start, 'ok')
+        return body
+    except urllib.error.HTTPError:
+        stats.record(name, 0, 'error')
+    except (OSError, ValueError, http.client.HTTPException) as e:
+        elapsed = time.perf_counter() - start
+        reason = e.reason if isinstance(e, urllib.error.URLError) else e
+        if isinstance(reason, (socket.timeout, TimeoutError)):
+            stats.record(name, 0, 'timeout')
+        elif server_timeout and elapsed >= server_timeout - 1:
+            # gunicorn 心跳间隔约 1s，worker 可能在略早于 server_timeout 时被杀
+            stats.record(name, 0, 'timeout')
+        else:
+            # 连接被重置 / 响应被截断（IncompleteRead）等
+            stats.record(name, 0, 'error')
+    return None
+
+
+def _json(body):
+    try:
+        return json.loads(body)
+    except ValueError:
+        return {}
+
+
+def run_session(url, payload, args, stats):
+    """回放一次完整的用户会话"""
+    # Flask 自带服务器不会杀掉超时请求
+    server_timeout = None if args.server == 'flask' else args.server_timeout
+    req = urllib.request.Request(url + '/')
+    ok = timed_request(stats, 'index', req, args.timeout, server_timeout) is not None
+
+    session_id = None
+    if ok:
+        body, content_type = encode_multipart('file', 'loadtest.csv', payload)
+        req = urllib.request.Request(
+            url + '/upload', data=body, method='POST',
+            headers={'Content-Type': content_type},
+        )
+        resp = timed_request(stats, 'upload', req, args.timeout, server_timeout)
+        if resp is not None:
+            session_id = _json(resp).get('session_id')
+            with stats.lock:
+                stats.session_ids.append(session_id)
+
+    if session_id:
+        body = json.dumps({
+            'session_id': session_id,
+            'data_column': 'data',
+            'name_column': 'name',
+            'chart_type': args.chart_type,
+        }).encode('utf-8')
+        req = urllib.request.Request(
+            url + '/process', data=body, method='POST',
+            headers={'Content-Type': 'application/json'},
+        )
+        resp = timed_request(stats, 'process', req, args.timeout, server_timeout)
+        ok = resp is not None and bool(_json(resp).get('success'))
+    else:
+        ok = False
+
+    if ok:
+        req = urllib.request.Request(f'{url}/download/{session_id}')
+        ok = timed_request(stats, 'download', req, args.timeout, server_timeout) is not None
+
+    with stats.lock:
+        if ok:
+            stats.sessions_ok += 1
+        else:
+            stats.sessions_failed += 1
+
+
+# ── 报告 ──────────────────────────────────────────────────
+
+def percentile(sorted_values, pct):
+    """最近秩法求分位数"""
+    if not sorted_values:
+        return None
+    k = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+def build_report(args, stats, wall, sampler, disk_before, disk_after):
+    endpoints = {}
+    for name in ENDPOINTS:
+        values = sorted(stats.latency[name])
+        total = len(values) + stats.errors[name] + stats.timeouts[name]
+        endpoints[name] = {
+            'requests': total,
+            'ok': len(values),
+            'errors': stats.errors[name],
+            'timeouts': stats.timeouts[name],
+            'error_rate': stats.errors[name] / total if total else 0.0,
+            'timeout_rate': stats.timeouts[name] / total if total else 0.0,
+            'p50': percentile(values, 50),
+            'p90': percentile(values, 90),
+            'p99': percentile(values, 99),
+            'max': values[-1] if values else None,
+        }
+    sessions = stats.sessions_ok + stats.sessions_failed
+    report = {
+        'config': {
+            'server': args.server,
+            'worker_class': args.worker_class,
+            'workers': args.workers,
+            'threads': args.threads,
+            'server_timeout': args.server_timeout,
+            'client_timeout': args.timeout,
+            'concurrency': args.concurrency,
+            'sessions': args.sessions,
+            'rows': args.rows,
+            'points': args.points,
+        },
+        'wall_seconds': wall,
+        'sessions_ok': stats.sessions_ok,
+        'sessions_failed': stats.sessions_failed,
+        'sessions_per_second': sessions / wall if wall else 0.0,
+        'endpoints': endpoints,
+        'disk_growth_bytes': None if disk_before is None else disk_after - disk_before,
+    }
+    if sampler is not None:
+        report['rss'] = {
+            'peak_total_bytes': sampler.peak_total,
+            'final_total_bytes': sampler.last_total,
+            'peak_per_process_bytes': {str(p): v for p, v in sampler.peak_per_pid.items()},
+        }
+    return report
+
+
+def _ms(value):
+    return '-' if value is None else f'{value * 1000:.0f}'
+
+
+def _mb(value):
+    return f'{value / 1024 / 1024:.1f} MB'
+
+
+def print_report(report):
+    cfg = report['config']
+    print()
+    print(f"服务: {cfg['server']}  worker-class={cfg['worker_class']}  "
+          f"workers={cfg['workers']}  threads={cfg['threads'] or '-'}")
+    print(f"负载: 并发 {cfg['concurrency']}  会话 {cfg['sessions']}  "
+          f"每文件 {cfg['rows']} 行 × {cfg['points']} 点")
+    print(f"耗时 {report['wall_seconds']:.1f}s  成功会话 {report['sessions_ok']}  "
+          f"失败会话 {report['sessions_failed']}  "
+          f"吞吐 {report['sessions_per_second']:.2f} 会话/s")
+    print()
+    print(f"{'接口':<10}{'请求':>6}{'错误率':>9}{'超时率':>9}"
+          f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for name, e in report['endpoints'].items():
+        print(f"{name:<10}{e['requests']:>6}{e['error_rate']:>9.1%}{e['timeout_rate']:>9.1%}"
+              f"{_ms(e['p50']):>9}{_ms(e['p90']):>9}{_ms(e['p99']):>9}{_ms(e['max']):>9}")
+    print(f"超时 = 客户端 {cfg['client_timeout']:g}s 超时 + 连接在约 "
+          f"{cfg['server_timeout']}s 后被断开（gunicorn 杀掉 worker）")
+    print()
+    if 'rss' in report:
+        rss = report['rss']
+        print(f"内存 RSS: 峰值合计 {_mb(rss['peak_total_bytes'])}  "
+              f"结束时 {_mb(rss['final_total_bytes'])}")
+        for pid, v in sorted(rss['peak_per_process_bytes'].items()):
+            print(f"  pid {pid}: 峰值 {_mb(v)}")
+    if report['disk_growth_bytes'] is None:
+        print('磁盘增长: 未采集（仅统计本工具启动的服务）')
+    else:
+        print(f"磁盘增长 (uploads + output): {_mb(report['disk_growth_bytes'])}")
+
+
+# ── 入口 ──────────────────────────────────────────────────
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='PIR CurveTools 本地压力测试')
+    parser.add_argument('--server', choices=('gunicorn', 'flask', 'none'), default='gunicorn',
+                        help='启动方式；none 表示压测 --url 指定的已运行服务')
+    parser.add_argument('--url', help='目标地址（--server none 时必填）')
+    parser.add_argument('--pid', type=int, help='已运行服务的主进程 pid，用于采集内存')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker 数')
+    parser.add_argument('--worker-class', default='sync',
+                        help='gunicorn worker 类型：sync / gthread / gevent 等')
+    parser.add_argument('--threads', type=int, default=0, help='gunicorn 每个 worker 的线程数')
+    parser.add_argument('--server-timeout', type=int, default=120,
+                        help='gunicorn --timeout；连接在此时长后被断开计为超时（压测已运行的服务时应与其一致）')
+    parser.add_argument('--concurrency', type=int, default=4, help='并发用户数')
+    parser.add_argument('--sessions', type=int, default=20, help='回放的会话总数')
+    parser.add_argument('--rows', type=int, default=100, help='每个上传文件的行数')
+    parser.add_argument('--points', type=int, default=200, help='每行数据点数')
+    parser.add_argument('--chart-type', default='line', choices=('line', 'bar', 'scatter'))
+    parser.add_argument('--timeout', type=float,
+                        help='客户端单次请求超时（秒），默认 --server-timeout + 10')
+    parser.add_argument('--json', dest='json_path', help='将报告另存为 JSON 文件')
+    parser.add_argument('--keep-files', action='store_true',
+                        help='保留压测产生的 uploads / output 会话目录（--server none 时从不清理）')
+    args = parser.parse_args(argv)
+    if args.server == 'none' and not args.url:
+        parser.error('--server none 需要同时指定 --url')
+    if args.timeout is None:
+        args.timeout = args.server_timeout + 10
+    return args
+
+
+def cleanup_sessions(session_ids):
+    for sid in session_ids:
+        if not sid:
+            continue
+        shutil.rmtree(os.path.join(UPLOAD_FOLDER, sid), ignore_errors=True)
+        shutil.rmtree(os.path.join(OUTPUT_FOLDER, sid), ignore_errors=True)
+        zip_file = os.path.join(OUTPUT_FOLDER, f'{sid}.zip')
+        if os.path.exists(zip_file):
+            os.remove(zip_file)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    payload = make_csv(args.rows, args.points)
+    print(f'测试文件大小 {_mb(len(payload))}')
+
+    proc = None
+    if args.server == 'none':
+        url = args.url.rstrip('/')
+        server_pid = args.pid
+    else:
+        port = free_port()
+        url = f'http://127.0.0.1:{port}'
+        proc = start_server(args, port)
+        server_pid = proc.pid
+
+    # 只有本工具启动的服务才使用本地 uploads / output 目录
+    local_dirs = proc is not None
+    stats = Stats()
+    sampler = None
+    disk_before = disk_after = None
+    try:
+        wait_ready(url, proc)
+        if local_dirs:
+            disk_before = dir_size(UPLOAD_FOLDER) + dir_size(OUTPUT_FOLDER)
+        if server_pid:
+            sampler = RssSampler(server_pid).start()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(run_session, url, payload, args, stats)
+                       for _ in range(args.sessions)]
+            for fut in futures:
+                fut.result()
+        wall = time.perf_counter() - start
+
+        if sampler is not None:
+            sampler.stop()
+        if local_dirs:
+            disk_after = dir_size(UPLOAD_FOLDER) + dir_size(OUTPUT_FOLDER)
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        stop_server(proc)
+        if local_dirs and not args.keep_files:
+            cleanup_sessions(stats.session_ids)
+
+    report = build_report(args, stats, wall, sampler, disk_before, disk_after)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if stats.sessions_failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())